@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Benchmark the shared echoport checksum engine (roles/echoport_backup/templates/lib/checksum.py.j2).
+
+Builds synthetic payload trees with different file-size distributions and
+reports make_checksum_manifest() throughput per worker count, next to the
+legacy serial 8 KiB read loop the runners used before the shared engine.
+
+    uv run python scripts/benchmark_echoport_checksum.py --scale 0.25 --workers 1,2,4,8
+
+Files are written once and hashed from the page cache, so the numbers show the
+CPU side of hashing; cold-cache runs on the target host are disk-bound.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import time
+import types
+from pathlib import Path
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined
+
+
+ROOT = Path(__file__).resolve().parents[1]
+TEMPLATE_DIR = ROOT / "roles" / "echoport_backup" / "templates"
+
+KIB = 1024
+MIB = 1024 * KIB
+
+# name -> (file count, size sampler); counts are multiplied by --scale.
+DISTRIBUTIONS = {
+    "small (4k x 8 KiB)": (4000, lambda rng: 8 * KIB),
+    "mixed (2k x 4 KiB-4 MiB, log-uniform)": (2000, lambda rng: int(2 ** rng.uniform(12, 22))),
+    "large (16 x 64 MiB)": (16, lambda rng: 64 * MIB),
+}
+
+
+def render_engine() -> types.ModuleType:
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), undefined=StrictUndefined, autoescape=False)
+    source = env.get_template("lib/archive.py.j2").render()
+    module = types.ModuleType("echoport_checksum_benchmark")
+    exec(compile(source, str(TEMPLATE_DIR / "lib" / "archive.py.j2"), "exec"), module.__dict__)
+    return module
+
+
+def build_tree(root: Path, count: int, sampler, rng: random.Random) -> int:
+    block = os.urandom(MIB)
+    total = 0
+    for index in range(count):
+        size = sampler(rng)
+        path = root / f"d{index % 64:02d}" / f"f{index:06d}.bin"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("wb") as handle:
+            remaining = size
+            while remaining:
+                chunk = block[: min(remaining, MIB)]
+                handle.write(chunk)
+                remaining -= len(chunk)
+        total += size
+    return total
+
+
+def legacy_sha256(filepath: Path) -> str:
+    sha256_hash = hashlib.sha256()
+    with open(filepath, "rb") as handle:
+        for chunk in iter(lambda: handle.read(8192), b""):
+            sha256_hash.update(chunk)
+    return sha256_hash.hexdigest()
+
+
+def legacy_manifest(root_dir: Path, manifest_path: Path) -> None:
+    """The per-runner implementation replaced by the shared engine."""
+    entries: list[Path] = []
+    for path in root_dir.rglob("*"):
+        if not path.is_file():
+            continue
+        if path.resolve() == manifest_path.resolve():
+            continue
+        entries.append(path)
+
+    entries.sort(key=lambda p: p.relative_to(root_dir).as_posix())
+    lines: list[str] = []
+    for item in entries:
+        rel = item.relative_to(root_dir).as_posix()
+        lines.append(f"{legacy_sha256(item)}  ./{rel}")
+    manifest_path.write_text("\n".join(lines) + ("\n" if lines else ""))
+
+
+def timed(func) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=0.25, help="multiply file counts (default 0.25)")
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated worker counts")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs (default 3)")
+    args = parser.parse_args()
+
+    engine = render_engine()
+    worker_counts = [int(item) for item in args.workers.split(",") if item.strip()]
+    rng = random.Random(1234)
+
+    print(f"{'distribution':<40} {'files':>7} {'MiB':>8}  {'engine':<10} {'MiB/s':>9} {'files/s':>9}")
+    for name, (count, sampler) in DISTRIBUTIONS.items():
+        work_dir = Path(tempfile.mkdtemp(prefix="checksum-bench-"))
+        try:
+            payload = work_dir / "payload"
+            files = max(1, int(count * args.scale))
+            total = build_tree(payload, files, sampler, rng)
+            manifest_path = work_dir / "manifest.sha256"
+
+            runs = [("serial-8k", lambda: legacy_manifest(payload, manifest_path))]
+            for workers in worker_counts:
+                runs.append((f"{workers} worker", lambda w=workers: engine.make_checksum_manifest(payload, manifest_path, workers=w)))
+
+            reference = None
+            for label, func in runs:
+                elapsed = min(timed(func) for _ in range(args.repeat))
+                output = manifest_path.read_text()
+                if reference is None:
+                    reference = output
+                elif output != reference:
+                    raise SystemExit(f"{label}: manifest differs from serial output")
+                print(
+                    f"{name:<40} {files:>7} {total / MIB:>8.1f}  {label:<10} "
+                    f"{total / MIB / elapsed:>9.1f} {files / elapsed:>9.0f}"
+                )
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
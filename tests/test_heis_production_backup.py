@@ -3,9 +3,12 @@
 from __future__ import annotations
 
 import contextlib
+import hashlib
 import io
 import shlex
+import shutil
 import subprocess
+import tempfile
 import types
 import unittest
 from pathlib import Path
@@ -18,7 +21,7 @@ ROOT = Path(__file__).resolve().parents[1]
 TEMPLATE_DIR = ROOT / "roles" / "echoport_backup" / "templates"
 
 
-def render_runner() -> tuple[types.ModuleType, str]:
+def render_runner(**overrides: object) -> tuple[types.ModuleType, str]:
     env = Environment(
         loader=FileSystemLoader(TEMPLATE_DIR),
         undefined=StrictUndefined,
@@ -38,6 +41,7 @@ def render_runner() -> tuple[types.ModuleType, str]:
         heis_production_backup_restore_owner="heis:heis",
         heis_production_backup_health_url="http://127.0.0.1:10020/",
         heis_production_backup_health_host="fabian-heis.de",
+        **overrides,
     )
     module = types.ModuleType("heis_production_backup_test")
     module.__file__ = str(TEMPLATE_DIR / "heis_production_backup.py.j2")
@@ -133,6 +137,37 @@ class HeisProductionBackupSafetyTests(unittest.TestCase):
             f"{shlex.quote(remote_command)}",
         )
 
+    def test_remote_commands_share_one_multiplexed_connection(self) -> None:
+        completed = subprocess.CompletedProcess([], 0, "", "")
+
+        def fake_run(command, **kwargs):
+            if isinstance(command, list) and "ControlMaster=yes" in command:
+                socket_path = command[command.index("ControlMaster=yes") + 2]
+                Path(socket_path.removeprefix("ControlPath=")).touch()
+            return completed
+
+        with (
+            mock.patch.dict(self.runner._SSH_MASTERS, clear=True),
+            mock.patch.dict(
+                self.runner.SSH_STATS, {"commands": 0, "handshakes": 0, "seconds": 0.0}
+            ),
+            mock.patch.object(self.runner.subprocess, "run", side_effect=fake_run) as run,
+        ):
+            self.runner.ssh("152.53.158.41", "root", "/usr/bin/true")
+            self.runner.ssh("152.53.158.41", "root", "/usr/bin/true")
+            self.runner.scp_from_remote("152.53.158.41", "root", "/srv/a", "/tmp/a")
+            socket_path = self.runner._SSH_MASTERS[("root", "152.53.158.41")]
+            report = self.runner.ssh_report()
+            self.assertEqual(self.runner.close_ssh_sessions(), [])
+
+        masters = [c for c in run.call_args_list if "ControlMaster=yes" in c.args[0]]
+        self.assertEqual(len(masters), 1)
+        for call in run.call_args_list[1:4]:
+            self.assertIn(f"-o ControlMaster=no -o ControlPath={socket_path}", call.args[0])
+        self.assertEqual(run.call_args.args[0][-3:], ["-O", "exit", "root@152.53.158.41"])
+        self.assertEqual((report["commands"], report["handshakes"]), (3, 1))
+        self.assertFalse(Path(socket_path).parent.exists())
+
     def test_partial_stop_failure_leaves_restart_watchdog_armed(self) -> None:
         completed = subprocess.CompletedProcess([], 0, "", "")
         stop_timeout = subprocess.TimeoutExpired("systemctl stop", 900)
@@ -173,6 +208,104 @@ class HeisProductionBackupSafetyTests(unittest.TestCase):
             )
         )
 
+    def test_zfs_source_mode_only_stops_services_for_the_snapshot(self) -> None:
+        runner, _ = render_runner(echoport_backup_source_mode="zfs_snapshot")
+        events: list[str] = []
+
+        def fake_ssh(host, user, command, check=True):
+            events.append(command)
+            stdout = "zfs tank/heis /home/heis/site\n" if command.startswith("findmnt") else ""
+            return subprocess.CompletedProcess([], 0, stdout, "")
+
+        with (
+            mock.patch.object(runner, "validate_db_path", return_value="/home/heis/site/db.sqlite3"),
+            mock.patch.object(runner, "validate_remote_directory", return_value="/home/heis/site/media"),
+            mock.patch.object(runner, "ssh", side_effect=fake_ssh),
+            mock.patch.object(runner, "stop_services", side_effect=lambda *args: events.append("STOP")),
+            mock.patch.object(runner, "start_services", side_effect=lambda *args: events.append("START")),
+            mock.patch.object(runner, "verify_services_active"),
+            mock.patch.object(runner, "scp_from_remote", side_effect=subprocess.CalledProcessError(1, "scp")),
+            contextlib.redirect_stdout(io.StringIO()),
+            contextlib.redirect_stderr(io.StringIO()),
+        ):
+            result = runner.backup(
+                remote_host="152.53.158.41",
+                remote_user="root",
+                db_path="/home/heis/site/db.sqlite3",
+                backup_files=["/home/heis/site/media"],
+                service_names=["heis.service"],
+                bucket="backups",
+                key_prefix="heis-production/test",
+                timestamp="test",
+            )
+
+        self.assertEqual(result, 1)  # stopped at the scp step
+        stop, start = events.index("STOP"), events.index("START")
+        self.assertEqual(len(events[stop + 1:start]), 1)
+        self.assertTrue(events[stop + 1].startswith("zfs snapshot tank/heis@echoport-heis-production-"))
+        backup_command = next(command for command in events if ".backup" in command)
+        self.assertGreater(events.index(backup_command), start)
+        self.assertIn("/home/heis/site/.zfs/snapshot/echoport-heis-production-", backup_command)
+        self.assertFalse(any(command.startswith("install -d -m 0700 /home/heis/backup-snapshots/") and "rsync" in command for command in events))
+        destroy = [command for command in events if command.startswith("zfs destroy tank/heis@echoport-heis-production-")]
+        self.assertEqual(len(destroy), 1)
+        self.assertGreater(events.index(destroy[0]), events.index(backup_command))
+
+    def test_remote_tree_streams_into_the_archive_and_back(self) -> None:
+        if shutil.which("zstd") is None:
+            self.skipTest("zstd binary not installed")
+
+        def local_shell(host, user, pipeline):
+            return "/bin/bash -o pipefail -c " + shlex.quote(pipeline)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp, "media")
+            (source / "docs").mkdir(parents=True)
+            (source / "docs" / "a.pdf").write_bytes(b"pdf" * 1000)
+            (source / "b.txt").write_text("hello")
+            (source / "escape").symlink_to("../../etc/passwd")
+            archive_path = Path(tmp, "backup.tar.gz")
+            stage = Path(tmp, "stage")
+            stage.mkdir()
+
+            with (
+                mock.patch.object(self.runner, "_ssh_command", side_effect=local_shell),
+                mock.patch.dict(self.runner.SSH_STATS),
+                contextlib.redirect_stderr(io.StringIO()),
+            ):
+                for codec in ("zstd", "none"):
+                    with self.subTest(codec=codec):
+                        entry = self.runner.RemoteTreeEntry("152.53.158.41", "root", str(source), codec)
+                        with open(archive_path, "wb") as handle:
+                            result = self.runner.write_archive(
+                                [(entry, "media")], handle, self.runner.archive_settings("heis-production")
+                            )
+                        members = {member["path"]: member for member in result["index"]["members"]}
+                        self.assertEqual(
+                            sorted(members), ["media", "media/b.txt", "media/docs", "media/docs/a.pdf"]
+                        )
+                        self.assertEqual(
+                            members["media/b.txt"]["sha256"], hashlib.sha256(b"hello").hexdigest()
+                        )
+                        self.assertEqual((entry.file_count, entry.size_bytes), (2, 3005))
+                        self.assertEqual(entry.skipped, ["./escape"])
+
+                        shutil.rmtree(stage / "media", ignore_errors=True)
+                        pushed = self.runner.push_archive_members(
+                            archive_path,
+                            lambda member: member.name.startswith("media"),
+                            "152.53.158.41",
+                            "root",
+                            str(stage),
+                            codec,
+                        )
+                        self.assertEqual(pushed, {"members": 4, "payload_bytes": 3005})
+                        self.assertEqual((stage / "media" / "docs" / "a.pdf").read_bytes(), b"pdf" * 1000)
+
+                failing = self.runner.RemoteTreeEntry("152.53.158.41", "root", str(Path(tmp, "missing")), "zstd")
+                with self.assertRaisesRegex(RuntimeError, "remote tar exited"):
+                    self.runner.write_archive([(failing, "media")], io.BytesIO(), self.runner.archive_settings())
+
     def test_runner_contains_remote_watchdogs_and_full_set_rollback(self) -> None:
         for required in (
             "heis-backup-watchdog",
@@ -0,0 +1,139 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+from jinja2 import Environment
+
+
+TEMPLATE_PATH = (
+    Path(__file__).resolve().parents[2]
+    / "roles"
+    / "fastdeploy_register_service"
+    / "templates"
+    / "deploy.py.j2"
+)
+
+
+class _FakeApi:
+    """FastDeploy API stand-in that records each POST with the client port it came from."""
+
+    def __init__(self, delay: float = 0.0, stalls: tuple[float, ...] = ()) -> None:
+        self.requests: list[tuple[str, int, dict]] = []
+        # Extra delays for the first requests, e.g. to outlast the client's timeout.
+        self.stalls = list(stalls)
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self) -> None:  # noqa: N802 - http.server naming
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                time.sleep(api.stalls.pop(0) if api.stalls else delay)
+                api.requests.append((self.path, self.client_address[1], json.loads(body)))
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _load_runner(tmp_path: Path, monkeypatch, api: _FakeApi) -> dict[str, Any]:
+    rendered = Environment().from_string(TEMPLATE_PATH.read_text(encoding="utf-8")).render(
+        fd_service_name="nyxmon",
+        fd_runner_config_path=str(tmp_path / "missing-config.json"),
+        fd_runner_secret_config_path=str(tmp_path / "missing-secrets.json"),
+        fd_ops_control_method="rsync",
+        fd_ops_control_ref="main",
+        fd_context_defaults={},
+        fd_ansible_playbook_bin="ansible-playbook",
+        fd_ansible_galaxy_bin="ansible-galaxy",
+        fd_sops_age_key_path=str(tmp_path / "age.txt"),
+        fd_ansible_config=str(tmp_path / "ansible.cfg"),
+        fd_ops_control_remote_path=str(tmp_path / "ops-control"),
+        fd_workspace_dir=str(tmp_path / "workspace"),
+    )
+    monkeypatch.delenv("DEPLOY_CONFIG_FILE", raising=False)
+    monkeypatch.setenv("ACCESS_TOKEN", "token")
+    monkeypatch.setenv("STEPS_URL", f"{api.url}/deployments/steps")
+    monkeypatch.setenv("DEPLOYMENT_FINISH_URL", f"{api.url}/deployments/finish")
+    namespace: dict[str, Any] = {"__name__": "fastdeploy_deploy_runner_test"}
+    exec(compile(rendered, str(TEMPLATE_PATH), "exec"), namespace)
+    return namespace
+
+
+def _finish_event(output: str) -> dict:
+    return [json.loads(line) for line in output.splitlines() if '"event": "finish"' in line][-1]
+
+
+def test_step_updates_do_not_wait_for_a_slow_api(tmp_path: Path, monkeypatch, capsys) -> None:
+    api = _FakeApi(delay=0.1)
+    try:
+        runner = _load_runner(tmp_path, monkeypatch, api)
+        started = time.monotonic()
+        for index in range(10):
+            runner["update_step"](f"task {index}", "running", "Executing task")
+        assert time.monotonic() - started < 0.1
+
+        runner["finish_deployment"]("success", "done")
+    finally:
+        api.close()
+
+    reporting = _finish_event(capsys.readouterr().out)["reporting"]
+    assert (reporting["sent"], reporting["dropped"], reporting["coalesced"]) == (10, 0, 0)
+    assert reporting["latency_max_ms"] >= 100
+    assert api.requests[-1][0] == "/deployments/finish"
+
+
+def test_updates_coalesce_and_share_one_connection(tmp_path: Path, monkeypatch, capsys) -> None:
+    api = _FakeApi(delay=0.05)
+    try:
+        runner = _load_runner(tmp_path, monkeypatch, api)
+        runner["update_step"]("init", "running", "Starting deployment")
+        time.sleep(0.01)
+        for state in ("running", "running", "success"):
+            runner["update_step"]("ansible", state, state)
+        runner["finish_deployment"]("success", "done")
+    finally:
+        api.close()
+
+    steps = [payload for path, _, payload in api.requests if path == "/deployments/steps"]
+    assert steps[-1] == {"name": "ansible", "state": "success", "message": "success"}
+    assert len({port for _, port, _ in api.requests}) == 1
+
+    reporting = _finish_event(capsys.readouterr().out)["reporting"]
+    assert reporting["queued"] == 4
+    assert reporting["coalesced"] == 2
+    assert (reporting["sent"], reporting["failed"], reporting["dropped"]) == (2, 0, 0)
+
+
+def test_a_timed_out_request_does_not_break_later_updates(tmp_path: Path, monkeypatch, capsys) -> None:
+    api = _FakeApi(stalls=(1.0,))
+    try:
+        runner = _load_runner(tmp_path, monkeypatch, api)
+        runner["HTTP_TIMEOUT"] = 0.2
+        runner["update_step"]("init", "running", "Starting deployment")
+        reporter = runner["get_reporter"]()
+        deadline = time.monotonic() + 5
+        while reporter.stats["failed"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        runner["update_step"]("ansible", "success", "done")
+        runner["finish_deployment"]("success", "done")
+    finally:
+        api.close()
+
+    reporting = _finish_event(capsys.readouterr().out)["reporting"]
+    assert (reporting["sent"], reporting["failed"]) == (1, 1)
+    paths = [path for path, _, payload in api.requests if payload.get("name") != "init"]
+    assert paths == ["/deployments/steps", "/deployments/finish"]